@@ -1,18 +1,17 @@
 import json
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 from src.evaluator import Evaluator
+from src.models import occurrence_scope
 from src.pipelines.standard import StandardRAG
+from src.pipelines.registry import PipelineRegistry
+from src.results_store import ResultsStore
 
-# Import Interventions
-from src.interventions.safety import SafetyRAG
-from src.interventions.privacy import PrivacyRAG
-from src.interventions.fairness import FairnessRAG
-from src.interventions.accountability import AccountabilityRAG
-from src.interventions.reliability import ReliabilityRAG
-from src.interventions.robustness import RobustnessRAG
+# Interventions are imported lazily by the registry when a variant is selected
+DIMENSIONS = ["safety", "privacy", "fairness", "reliability", "robustness"]
 
 class MockSafetyClassifier:
     def predict(self, text):
@@ -21,33 +20,147 @@ class MockSafetyClassifier:
             return "unsafe"
         return "safe"
 
+def run_sample(pipeline, sample):
+    # Extract query based on dataset type
+    query = sample.get('question') or sample.get('prompt') or sample.get('goal') or ""
+    if not query:
+        return None
+
+    # Interventions wrap the shared StandardRAG; its per-thread reports say what
+    # was deduplicated and cut for this sample, whichever variant ran it
+    base = getattr(pipeline, "base", pipeline)
+    reports = hasattr(base, "clear_reports")
+    if reports:
+        base.clear_reports()
+
+    try:
+        # Run the pipeline; repeated prompts are counted per run (seeds, cache keys)
+        with occurrence_scope():
+            res = pipeline.run(query)
+        if reports:
+            res["context_packing"] = base.last_packing
+            res["dedup"] = base.last_dedup
+            if base.last_packed_context is not None:
+                # Store what the model actually saw, not the pre-packing retrieval
+                res["context"] = base.last_packed_context
+
+        # Store result with ground truth metadata
+        res['ground_truth'] = sample
+        return res
+    except Exception as e:
+        print(f"    Error processing sample: {e}")
+        return None
+
 def main():
     parser = argparse.ArgumentParser(description="Run RAG Trustworthiness Benchmark")
     parser.add_argument("--model", type=str, default="meta-llama/Meta-Llama-3-8B-Instruct", help="HuggingFace model name")
     parser.add_argument("--data", type=str, default="data/composite_test_set.json", help="Path to dataset")
-    parser.add_argument("--output", type=str, default="results/benchmark_data.json", help="Path to output results")
+    parser.add_argument("--output", type=str, default="results/benchmark_data.json",
+                        help="Path to output results (documents and samples stored once, see src/results_store.py)")
+    parser.add_argument("--legacy_output", type=str, default=None,
+                        help="Also export results with full context/ground truth copied into every response")
+    parser.add_argument("--variants", type=str, default="all",
+                        help=f"Comma-separated pipeline variants to run, or 'all' ({', '.join(PipelineRegistry.available())})")
+    parser.add_argument("--dimensions", type=str, default="all",
+                        help=f"Comma-separated dimensions to evaluate, or 'all' ({', '.join(DIMENSIONS)})")
+    parser.add_argument("--max_context_tokens", type=int, default=2048,
+                        help="Token budget for retrieved context in generation prompts")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Drop near-duplicate retrieved documents (MinHash/LSH) before generation")
+    parser.add_argument("--fairness_mode", type=str, default="round_robin", choices=["round_robin", "mmr"],
+                        help="FairnessRAG reranker: source round-robin or embedding-based exposure-constrained MMR")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for sampling and stochastic pipeline stages")
+    parser.add_argument("--llm_cache", type=str, default=None,
+                        help="Path to a persistent LLM response cache (SQLite); replays seeded/deterministic generations")
+    parser.add_argument("--clear_llm_cache", action="store_true", help="Empty the LLM response cache before running")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Samples run concurrently; >1 micro-batches their LLM calls into shared forward passes")
+    parser.add_argument("--max_batch_size", type=int, default=8, help="Max prompts per micro-batch (with --workers > 1)")
+    parser.add_argument("--max_wait_ms", type=float, default=10.0, help="Max time to wait to fill a micro-batch")
+    parser.add_argument("--prefix_cache", type=int, default=0,
+                        help="Number of prompt KV states to keep for prefix reuse across generations (0 disables; needs --workers 1)")
+    parser.add_argument("--device", type=str, default="auto", choices=["auto", "cpu"],
+                        help="'auto': float16 with automatic device map; 'cpu': CPU inference mode")
+    parser.add_argument("--cpu_dtype", type=str, default="bfloat16", choices=["bfloat16", "float32"],
+                        help="Weight dtype for --device cpu")
+    parser.add_argument("--int8", action="store_true", help="Dynamic int8 quantization of linear layers (--device cpu)")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op CPU threads (torch.set_num_threads)")
+    parser.add_argument("--interop_threads", type=int, default=None, help="Inter-op CPU threads")
+    parser.add_argument("--draft_model", type=str, default=None,
+                        help="Small model with the same tokenizer for assisted (speculative) decoding")
+    parser.add_argument("--num_assistant_tokens", type=int, default=None,
+                        help="Initial number of draft tokens proposed per step")
+    parser.add_argument("--safety_lexicon", type=str, default=None,
+                        help="Policy lexicon (e.g. data/safety_lexicon.txt) for an opt-in SafetyRAG prefilter; "
+                             "only texts with a hit reach the classifier")
+    parser.add_argument("--mock", action="store_true",
+                        help="Use MockLLM and offline MockRetriever (no model load, no network)")
     args = parser.parse_args()
 
-    print(f"🚀 Starting Benchmark with model: {args.model}")
-    
-    # Base Pipeline
     try:
-        naive_pipeline = StandardRAG(args.model)
-    except Exception as e:
-        print(f"Failed to initialize StandardRAG: {e}")
-        return
+        variants = PipelineRegistry.select(args.variants)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.dimensions.strip().lower() == "all":
+        dimensions = list(DIMENSIONS)
+    else:
+        dimensions = [d.strip().lower() for d in args.dimensions.split(",") if d.strip()]
+        unknown = [d for d in dimensions if d not in DIMENSIONS]
+        if unknown:
+            parser.error(f"Unknown dimension(s): {', '.join(unknown)}. Available: {', '.join(DIMENSIONS)}")
+    if args.prefix_cache and args.workers > 1:
+        # Micro-batches run as one padded forward; only single-prompt generation reuses prefixes
+        parser.error("--prefix_cache has no effect with --workers > 1; use one or the other")
+
+    print(f"🚀 Starting Benchmark with model: {args.model}{' (mock)' if args.mock else ''}")
+
+    cache = None
+    if args.llm_cache:
+        from src.cache import ResponseCache
+        cache = ResponseCache(args.llm_cache)
+        if args.clear_llm_cache:
+            print(f"Cleared {cache.invalidate()} cached responses from {args.llm_cache}")
+
+    backends = {}
+
+    def build_base():
+        deduplicator = None
+        if args.dedup:
+            from src.dedup import NearDuplicateFilter
+            deduplicator = NearDuplicateFilter()
+        retriever = None
+        if args.mock:
+            from src.models import MockLLM
+            from src.retrieval import MockRetriever
+            llm = MockLLM(args.model)
+            retriever = MockRetriever()
+        else:
+            from src.models import HuggingFaceLLM
+            llm = HuggingFaceLLM(args.model, seed=args.seed, prefix_cache_size=args.prefix_cache,
+                                 device=args.device, cpu_dtype=args.cpu_dtype, quantize_int8=args.int8,
+                                 num_threads=args.threads, num_interop_threads=args.interop_threads,
+                                 draft_model_name=args.draft_model, num_assistant_tokens=args.num_assistant_tokens)
+            backends["llm"] = llm
+        if args.workers > 1:
+            from src.scheduler import BatchingLLM
+            llm = BatchingLLM(llm, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+        if cache is not None:
+            from src.models import CachedLLM
+            llm = CachedLLM(llm, cache)
+        return StandardRAG(args.model, llm=llm, retriever=retriever,
+                           max_context_tokens=args.max_context_tokens, deduplicator=deduplicator)
+
+    safety_kwargs = {"safety_classifier": MockSafetyClassifier()}
+    if args.safety_lexicon and "Safety-RAG" in variants:
+        from src.lexicon import LexiconMatcher
+        safety_kwargs["prefilter"] = LexiconMatcher.from_file(args.safety_lexicon)
+
+    # Pipelines (and the base model) are instantiated on first use
+    registry = PipelineRegistry(build_base, variant_kwargs={
+        "Safety-RAG": safety_kwargs,
+        "Fairness-RAG": {"mode": args.fairness_mode, "seed": args.seed},
+    })
 
-    # Instantiate Variants
-    pipelines = {
-        "Naive-RAG": naive_pipeline,
-        "Safety-RAG": SafetyRAG(naive_pipeline, safety_classifier=MockSafetyClassifier()),
-        "Privacy-RAG": PrivacyRAG(naive_pipeline),
-        "Fairness-RAG": FairnessRAG(naive_pipeline),
-        "Accountability-RAG": AccountabilityRAG(naive_pipeline), 
-        "Reliability-RAG": ReliabilityRAG(naive_pipeline, num_samples=3), # 3 samples for speed
-        "Robustness-RAG": RobustnessRAG(naive_pipeline)
-    }
-    
     # Load Dataset
     print(f"Loading dataset from {args.data}...")
     try:
@@ -58,60 +171,99 @@ def main():
         return
 
     evaluator = Evaluator()
-    results = {}
-    
-    # Dimensions to test
-    dimensions = ["safety", "privacy", "fairness", "reliability", "robustness"]
-    
-    for name, pipeline in pipelines.items():
+    results = ResultsStore()
+    score_records = []
+
+    for name in variants:
+        try:
+            pipeline = registry.get(name)
+        except Exception as e:
+            print(f"Failed to initialize {name}: {e}")
+            continue
+
         print(f"\n🧪 Evaluating {name}...")
-        results[name] = {}
-        
+
         # Run on each dimension
         for dim in dimensions:
             if dim not in dataset:
                 continue
-                
+
             print(f"  - Processing {dim} ({len(dataset[dim])} samples)...")
             samples = dataset[dim]
-            responses = []
-            
-            for sample in tqdm(samples):
-                # Extract query based on dataset type
-                query = sample.get('question') or sample.get('prompt') or sample.get('goal') or ""
-                if not query:
-                    continue
-                    
-                try:
-                    # Run the pipeline
-                    res = pipeline.run(query)
-                    
-                    # Store result with ground truth metadata
-                    res['ground_truth'] = sample
-                    responses.append(res)
-                except Exception as e:
-                    print(f"    Error processing sample: {e}")
-            
-            # Save raw responses for this dimension
-            results[name][dim] = responses
+            executor = ThreadPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+            if executor:
+                # Concurrent samples share forward passes through the BatchingLLM
+                outputs = executor.map(lambda sample: run_sample(pipeline, sample), samples)
+            else:
+                outputs = (run_sample(pipeline, sample) for sample in samples)
+
+            # Store each response as soon as it is done; documents and samples are kept once
+            for res in tqdm(outputs, total=len(samples)):
+                if res is not None:
+                    stored = results.add(name, dim, res)
+                    score = evaluator.score_response(dim, res)
+                    if score is not None:
+                        score_records.append({"variant": name, "dimension": dim,
+                                              "sample": stored["ground_truth_ref"], "score": score})
+            if executor:
+                executor.shutdown()
 
         # Calculate Scores (Simulated for visualization compatibility)
         print("  - Calculating scores (using Evaluator simulation)...")
         scores = evaluator.run_full_eval(name, args.model)
-        results[name]["scores"] = scores
-    
+        results.set_scores(name, scores)
+
     # Save Full Results (Responses + Scores)
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    with open(args.output, "w") as f:
-        json.dump(results, f, indent=4)
-        
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    results.save(args.output)
+    if args.legacy_output:
+        results.export_legacy(args.legacy_output)
+
     # Extract just scores for visualization script
-    viz_data = {k: v["scores"] for k, v in results.items()}
-    with open("results/viz_data.json", "w") as f:
+    viz_path = os.path.join(output_dir, "viz_data.json")
+    viz_data = {k: v["scores"] for k, v in results.results.items()}
+    with open(viz_path, "w") as f:
         json.dump(viz_data, f, indent=4)
-        
+
+    # Per-sample score records that src/visualize.py bootstraps confidence
+    # intervals from. Keyed by (model, seed, config, mock, variant, dimension,
+    # sample): a rerun replaces its records, other seeds/models/settings
+    # accumulate. Mock outputs (--mock or a failed model load) are tagged and
+    # skipped by default there.
+    from src.aggregate import config_id, upsert_records
+    mock = args.mock or not getattr(backends.get("llm"), "available", False)
+    # Settings that change the scores; batching, caching and threads don't
+    settings = {name: getattr(args, name) for name in (
+        "data", "max_context_tokens", "dedup", "fairness_mode", "safety_lexicon",
+        "device", "cpu_dtype", "int8", "draft_model", "num_assistant_tokens")}
+    config = config_id(settings)
+    records_path = os.path.join(output_dir, "score_records.jsonl")
+    replaced = upsert_records(records_path, [dict(r, model=args.model, seed=args.seed, config=config, mock=mock)
+                                             for r in score_records])
+    print(f"Wrote {len(score_records)} score records to {records_path}"
+          f"{f' (replaced {replaced} from an earlier run)' if replaced else ''}")
+    print(f"Config {config}: {json.dumps(settings, sort_keys=True)}")
+
+    if getattr(backends.get("llm"), "available", False):
+        perf = backends["llm"].perf_stats()
+        print(f"LLM perf ({perf['device']}): load {perf['load_time_s']:.1f}s, "
+              f"{perf['tokens_per_sec']:.1f} tokens/s over {perf['generated_tokens']} tokens, "
+              f"RSS {perf['rss_mb']:.0f} MB (peak {perf['peak_rss_mb']:.0f} MB)")
+        if perf["assisted"]:
+            print(f"Assisted decoding: {perf['assisted']['acceptance_rate']:.0%} draft tokens accepted, "
+                  f"{perf['assisted']['tokens_per_step']:.2f} tokens per backbone step")
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+              f"{stats['entries']} entries / {stats['bytes'] / 1e6:.1f} MB in {stats['path']}")
+        cache.close()
+
     print(f"\n✅ Benchmark Complete. Results saved to {args.output}")
-    print("To visualize, run: python3 src/visualize.py --results_file results/viz_data.json")
+    print(f"To visualize, run: python3 src/visualize.py --results_file {records_path} --model {args.model}"
+          f" --config {config}{' --include_mock' if mock else ''}")
 
 if __name__ == "__main__":
     main()
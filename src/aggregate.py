@@ -0,0 +1,166 @@
+import os
+import json
+import glob
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# One score per (configuration, variant, dimension, sample); see upsert_records
+RECORD_KEY = ("model", "seed", "config", "mock", "variant", "dimension", "sample")
+
+def config_id(settings: Dict) -> str:
+    """Short stable hash of the run settings that change scores (stored as "config")."""
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def upsert_records(path: str, records: List[Dict], key_fields: Tuple[str, ...] = RECORD_KEY) -> int:
+    """
+    Add score records to a JSON Lines file, replacing existing records with the
+    same key, so rerunning a configuration replaces its samples instead of
+    counting them twice. The file is streamed through a temporary copy, never
+    loaded whole. Returns the number of records replaced.
+    """
+    def key(record):
+        return tuple(record.get(field) for field in key_fields)
+
+    new_keys = {key(r) for r in records}
+    replaced = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as out:
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    if key(json.loads(line)) in new_keys:
+                        replaced += 1
+                        continue
+                    out.write(line if line.endswith("\n") else line + "\n")
+        for record in records:
+            out.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+    return replaced
+
+def iter_score_batches(paths: Iterable[str], model: Optional[str] = None, config: Optional[str] = None,
+                       include_mock: bool = False,
+                       chunksize: int = 200_000) -> Iterator[Tuple[str, str, np.ndarray]]:
+    """
+    Stream (variant, dimension, scores) batches from result files.
+
+    Accepts JSON Lines shards (one {"variant", "dimension", "sample", "score", ...}
+    record per line, parsed `chunksize` lines at a time) and score summaries
+    such as viz_data.json ({variant: {dimension: score}}). Globs are expanded
+    and directories are searched for *.jsonl shards. Only one chunk is held in
+    memory at a time. model and config (a config_id) keep only matching records;
+    records from --mock runs are skipped unless include_mock.
+    """
+    for pattern in paths:
+        if os.path.isdir(pattern):
+            files = sorted(glob.glob(os.path.join(pattern, "*.jsonl")))
+        else:
+            files = sorted(glob.glob(pattern)) or [pattern]
+        for path in files:
+            if path.endswith(".jsonl"):
+                for chunk in pd.read_json(path, lines=True, chunksize=chunksize):
+                    if model is not None and "model" in chunk:
+                        chunk = chunk[chunk["model"] == model]
+                    if config is not None and "config" in chunk:
+                        chunk = chunk[chunk["config"] == config]
+                    if not include_mock and "mock" in chunk:
+                        chunk = chunk[chunk["mock"].fillna(False) != True]
+                    for (variant, dim), group in chunk.groupby(["variant", "dimension"], sort=False):
+                        yield variant, dim, group["score"].to_numpy(dtype=np.float32)
+            else:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                for variant, scores in data.items():
+                    # Full results files keep the summary under "scores"
+                    scores = scores.get("scores", scores) if isinstance(scores, dict) else {}
+                    for dim, score in scores.items():
+                        if isinstance(score, (int, float)):
+                            yield variant, dim, np.array([score], dtype=np.float32)
+
+class ScoreAggregator:
+    """
+    Accumulates per-sample scores into per-(variant, dimension) float32 arrays
+    and summarizes them with bootstrap confidence intervals. Memory is 4 bytes
+    per score regardless of how large or how many the input files are.
+    """
+    def __init__(self):
+        self._chunks = {}
+
+    def add(self, variant: str, dimension: str, scores):
+        self._chunks.setdefault((variant, dimension), []).append(np.asarray(scores, dtype=np.float32).ravel())
+
+    def consume(self, batches: Iterable[Tuple[str, str, np.ndarray]]) -> "ScoreAggregator":
+        for variant, dimension, scores in batches:
+            self.add(variant, dimension, scores)
+        return self
+
+    def arrays(self) -> Dict[Tuple[str, str], np.ndarray]:
+        for key, chunks in self._chunks.items():
+            if len(chunks) > 1:
+                # Compact so repeated calls don't re-concatenate
+                self._chunks[key] = [np.concatenate(chunks)]
+        return {key: chunks[0] for key, chunks in self._chunks.items()}
+
+    def summary(self, n_boot: int = 1000, ci: float = 0.95, seed: int = 0) -> pd.DataFrame:
+        """
+        One row per (variant, dimension): n, mean, ci_low, ci_high.
+        """
+        rng = np.random.default_rng(seed)
+        rows = []
+        for (variant, dim), scores in self.arrays().items():
+            low, high = bootstrap_ci(scores, n_boot=n_boot, ci=ci, rng=rng)
+            rows.append({"variant": variant, "dimension": dim, "n": len(scores),
+                         "mean": float(scores.mean(dtype=np.float64)), "ci_low": low, "ci_high": high})
+        return pd.DataFrame(rows, columns=["variant", "dimension", "n", "mean", "ci_low", "ci_high"])
+
+def bootstrap_ci(scores: np.ndarray, n_boot: int = 1000, ci: float = 0.95,
+                 rng: Optional[np.random.Generator] = None,
+                 max_elements: int = 1 << 24, max_unique: int = 1024) -> Tuple[float, float]:
+    """
+    Percentile bootstrap CI of the mean, fully vectorized.
+
+    Small samples draw the whole (n_boot, n) resampling index matrix at once.
+    Larger ones resample counts over the distinct score values instead (binned
+    into max_unique bins if needed; bin means keep the overall mean exact):
+    exact multinomial draws for few values, the Poisson bootstrap otherwise.
+    Cost is then independent of the number of records.
+    """
+    rng = rng or np.random.default_rng()
+    scores = np.asarray(scores, dtype=np.float64)
+    n = len(scores)
+    if n == 0:
+        return float("nan"), float("nan")
+    if n == 1:
+        return float(scores[0]), float(scores[0])
+
+    if n * n_boot <= max_elements:
+        means = scores[rng.integers(0, n, size=(n_boot, n))].mean(axis=1)
+    else:
+        values, counts = np.unique(scores, return_counts=True)
+        if len(values) > max_unique:
+            bins = ((scores - values[0]) / (values[-1] - values[0]) * max_unique).astype(np.int64)
+            bins = np.minimum(bins, max_unique - 1)
+            counts = np.bincount(bins, minlength=max_unique)
+            sums = np.bincount(bins, weights=scores, minlength=max_unique)
+            occupied = counts > 0
+            counts, values = counts[occupied], sums[occupied] / counts[occupied]
+        if len(values) <= 64:
+            weights = rng.multinomial(n, counts / n, size=n_boot)
+        else:
+            weights = rng.poisson(counts, size=(n_boot, len(counts)))
+        means = (weights @ values) / weights.sum(axis=1)
+
+    alpha = (1 - ci) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+def pivot(summary: pd.DataFrame, column: str = "mean") -> pd.DataFrame:
+    """Variant x dimension table of one summary column."""
+    table = summary.pivot(index="variant", columns="dimension", values=column)
+    table.index.name = None
+    table.columns.name = None
+    return table
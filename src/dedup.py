@@ -0,0 +1,105 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+class NearDuplicateFilter:
+    """
+    Removes near-duplicate retrieved documents (the same snippet served under
+    several URLs) using MinHash signatures and an LSH banding index.
+
+    Two documents are duplicates when the estimated Jaccard similarity of their
+    character shingles is >= threshold. LSH only proposes candidate pairs from
+    shared bands, so each query costs O(docs) instead of O(docs^2) comparisons.
+    """
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        text = re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", text.lower())).strip()
+        k = self.shingle_size
+        grams = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """MinHash signatures for a batch of texts, shape (len(texts), num_perm)."""
+        if not texts:
+            return np.empty((0, self.num_perm), dtype=np.uint64)
+        shingles = [self._shingles(t) for t in texts]
+        offsets = np.cumsum([0] + [len(s) for s in shingles[:-1]])
+        # One vectorized permutation pass over every shingle in the batch,
+        # then a segmented min per document.
+        hashed = (np.concatenate(shingles)[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return np.minimum.reduceat(hashed, offsets, axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _filter(self, docs: List[Dict], sigs: np.ndarray, index: Dict, kept_sigs: List, kept_sources: List) -> Tuple[List[Dict], List[Dict]]:
+        kept, removed = [], []
+        for i, doc in enumerate(docs):
+            keys = self._band_keys(sigs[i])
+            candidates = {j for band, key in enumerate(keys) for j in index.get((band, key), ())}
+            duplicate_of = None
+            for j in sorted(candidates):
+                if np.mean(kept_sigs[j] == sigs[i]) >= self.threshold:
+                    duplicate_of = j
+                    break
+            if duplicate_of is not None:
+                removed.append({"index": i, "title": doc.get("title", ""),
+                                "source": doc.get("source", ""), "duplicate_of": kept_sources[duplicate_of]})
+                continue
+            for band, key in enumerate(keys):
+                index[(band, key)].append(len(kept_sigs))
+            kept_sigs.append(sigs[i])
+            kept_sources.append(doc.get("source", ""))
+            kept.append(doc)
+        return kept, removed
+
+    def dedup(self, docs: List[Dict]) -> Tuple[List[Dict], Dict[str, Any]]:
+        """
+        Drop near-duplicates from one query's results, keeping the first (most
+        relevant) copy. Returns (kept_docs, report).
+        """
+        sigs = self.signatures([doc.get("content", "") for doc in docs])
+        kept, removed = self._filter(docs, sigs, defaultdict(list), [], [])
+        return kept, {"input_docs": len(docs), "kept_docs": len(kept), "removed": removed}
+
+    def dedup_batch(self, contexts: List[List[Dict]], across_queries: bool = False) -> Tuple[List[List[Dict]], List[Dict[str, Any]]]:
+        """
+        Deduplicate the results of several queries with a single signature pass.
+        By default each query is deduplicated independently; with across_queries,
+        a document already kept for an earlier query in the batch is dropped too
+        (useful when the contexts are consumed together, e.g. shared scrubbing).
+        """
+        flat = [doc.get("content", "") for docs in contexts for doc in docs]
+        all_sigs = self.signatures(flat)
+
+        index, kept_sigs, kept_sources = defaultdict(list), [], []
+        outputs, reports = [], []
+        start = 0
+        for docs in contexts:
+            sigs = all_sigs[start:start + len(docs)]
+            start += len(docs)
+            if not across_queries:
+                index, kept_sigs, kept_sources = defaultdict(list), [], []
+            kept, removed = self._filter(docs, sigs, index, kept_sigs, kept_sources)
+            outputs.append(kept)
+            reports.append({"input_docs": len(docs), "kept_docs": len(kept), "removed": removed})
+        return outputs, reports
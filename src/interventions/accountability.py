@@ -1,15 +1,31 @@
 import hashlib
-import torch
-from transformers import LogitsProcessor
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING
+from ..models import SeededSampler, derive_seed, next_occurrence
+from ..pipelines.context import build_prompt
 
-class KGWWatermarkLogitsProcessor(LogitsProcessor):
+if TYPE_CHECKING:
+    import torch
+
+class KGWWatermarkLogitsProcessor:
+    """
+    KGW green-list watermark. Duck-types transformers' LogitsProcessor
+    (a callable on (input_ids, scores)) so this module can be imported
+    without loading torch/transformers.
+    """
     def __init__(self, vocab_size: int, gamma: float = 0.5, delta: float = 2.0, hash_key: int = 15485863):
         self.vocab_size = vocab_size
         self.gamma = gamma # Proportion of green list
         self.delta = delta # Logit bias magnitude
         self.hash_key = hash_key
 
-    def _get_greenlist_ids(self, input_ids: torch.LongTensor) -> list:
+    def params(self) -> dict:
+        """Settings that change the watermarked output."""
+        return {"gamma": self.gamma, "delta": self.delta, "hash_key": self.hash_key}
+
+    def _get_greenlist_ids(self, input_ids: "torch.LongTensor") -> list:
+        import torch
         # Simple implementation: Hash the last token to seed RNG
         last_token = input_ids[-1].item()
         seed = (self.hash_key * last_token) % self.vocab_size
@@ -20,7 +36,8 @@ class KGWWatermarkLogitsProcessor(LogitsProcessor):
         green_size = int(self.vocab_size * self.gamma)
         return perm[:green_size]
 
-    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+    def __call__(self, input_ids: "torch.LongTensor", scores: "torch.FloatTensor") -> "torch.FloatTensor":
+        import torch
         if input_ids.shape[1] == 0:
             return scores
         green_list = self._get_greenlist_ids(input_ids[0])
@@ -33,8 +50,11 @@ class AccountabilityRAG:
     Implements Watermarking for Accountability.
     Note: Requires direct access to the model logits.
     """
-    def __init__(self, base_pipeline, gamma=0.5, delta=2.0):
+    def __init__(self, base_pipeline, gamma=0.5, delta=2.0, max_new_tokens=200):
         self.base = base_pipeline
+        self.max_new_tokens = max_new_tokens
+        self._occurrences = Counter()
+        self._lock = threading.Lock()
         # Access underlying HF model from StandardRAG -> HuggingFaceLLM
         if hasattr(self.base, 'llm') and hasattr(self.base.llm, 'tokenizer'):
             self.tokenizer = self.base.llm.tokenizer
@@ -52,24 +72,49 @@ class AccountabilityRAG:
         if not self.watermarker:
             return self.base.generate(query, context)
             
-        # Replicate prompt formatting from StandardRAG
-        context_str = "\n".join([f"[{doc['title']}] {doc['content']}" for doc in context])
-        prompt = f"""Use the following context to answer the question.
-        
-Context:
-{context_str}
+        # Same prompt and token budget as StandardRAG
+        if hasattr(self.base, 'pack_context'):
+            context = self.base.pack_context(context)
+        prompt = build_prompt(query, context)
 
-Question: {query}
+        # Replay from the LLM response cache (CachedLLM) when there is one. The
+        # watermark settings are part of the key, so these never collide with
+        # plain generations of the same prompt.
+        llm = self.base.llm
+        cached_generate = getattr(llm, "cached_generate", None)
+        if cached_generate is not None:
+            params = dict(llm.decoding_params(), watermark=self.watermarker.params())
+            return cached_generate(prompt, lambda seed: self._watermarked_generate(prompt, seed),
+                                   max_new_tokens=self.max_new_tokens, params=params)
+        return self._watermarked_generate(prompt, self._resolve_seed(prompt))
 
-Answer:"""
-        
+    def _resolve_seed(self, prompt):
+        # Same per-call seed CachedLLM derives, so cached and uncached runs agree
+        seed = self.base.llm.decoding_params().get("seed")
+        if seed is None:
+            return None
+        occurrence = next_occurrence(("watermark", prompt), self._occurrences, self._lock)
+        return derive_seed(seed, prompt, occurrence)
+
+    def _watermarked_generate(self, prompt, seed):
         inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-        
+        # Sampling is required for watermarking entropy
+        if seed is not None:
+            # Sample from the watermarked scores with a per-call generator (the
+            # global torch RNG is shared by concurrent --workers threads)
+            config = self.model.generation_config
+            sampler = SeededSampler([seed], temperature=config.temperature or 1.0, top_p=config.top_p or 1.0)
+            sampling_kwargs = {"logits_processor": [self.watermarker, sampler], "do_sample": False,
+                               "temperature": None, "top_p": None, "top_k": None}
+        else:
+            sampling_kwargs = {"logits_processor": [self.watermarker], "do_sample": True}
+
+        # Calls the backbone directly, so assisted decoding (HuggingFaceLLM draft
+        # model) is never used here: draft proposals would ignore the green list.
         outputs = self.model.generate(
             **inputs,
-            logits_processor=[self.watermarker],
-            max_new_tokens=200,
-            do_sample=True # Required for watermarking entropy
+            max_new_tokens=self.max_new_tokens,
+            **sampling_kwargs
         )
         # Decode only the new tokens
         return self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
@@ -77,4 +122,5 @@ Answer:"""
     def run(self, query):
         context = self.base.retrieve(query)
         response = self.generate(query, context)
-        return {"response": response, "context": context}
+        return {"response": response, "context": context, "context_packing": getattr(self.base, 'last_packing', None),
+                "dedup": getattr(self.base, 'last_dedup', None)}
@@ -1,51 +1,129 @@
 from typing import List, Dict
+import math
 import random
+import hashlib
 from collections import defaultdict
+from urllib.parse import urlparse
+
+import numpy as np
 
 class FairnessRAG:
     """
     Implements Fair RAG (arXiv:2409.11598).
     Ensures fair exposure of different sources in the context.
+
+    Modes:
+      - "round_robin": group by source, then Round-Robin selection.
+      - "mmr": embed the candidates in one batch and run an exposure-constrained
+        Maximal Marginal Relevance selection (relevance vs. redundancy, with at
+        most `max_per_group` documents per source domain).
     """
-    def __init__(self, base_pipeline, top_k=5):
+    def __init__(self, base_pipeline, top_k=5, mode="round_robin", mmr_lambda=0.7,
+                 max_per_group=None, embedder=None,
+                 embedding_model="sentence-transformers/all-MiniLM-L6-v2", seed=0):
+        if mode not in ("round_robin", "mmr"):
+            raise ValueError(f"Unknown fairness mode '{mode}'. Use 'round_robin' or 'mmr'.")
         self.base = base_pipeline
         self.top_k = top_k
-        
-    def _fair_rerank(self, docs: List[Dict]) -> List[Dict]:
+        self.mode = mode
+        self.mmr_lambda = mmr_lambda # Weight of relevance vs. diversity
+        self.max_per_group = max_per_group
+        self.seed = seed # From the run config; each query derives its own RNG from it
+
+        self.embedder = embedder
+        if self.mode == "mmr" and self.embedder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self.embedder = SentenceTransformer(embedding_model)
+            except Exception as e:
+                print(f"⚠ Could not load embedding model {embedding_model}: {e}")
+                print("  Falling back to round-robin fair reranking.")
+                self.mode = "round_robin"
+
+    @staticmethod
+    def _group_id(doc: Dict) -> str:
+        # Use source domain, or a stable hash of the content as group identifier
+        source = doc.get("source", "unknown") or "unknown"
+        if source == "unknown":
+            return hashlib.md5(doc.get("content", "")[:50].encode("utf-8")).hexdigest()
+        return urlparse(source).netloc or source
+
+    def _fair_rerank(self, query: str, docs: List[Dict]) -> List[Dict]:
         """
         Re-ranks docs to ensure diversity of sources.
         Algorithm: Group by source, then Round-Robin selection.
         """
         groups = defaultdict(list)
         for doc in docs:
-            # Use 'source' or hash of content as group identifier
-            group_id = doc.get("source", "unknown")
-            if group_id == "unknown":
-                group_id = hash(doc.get("content", "")[:50])
-            groups[group_id].append(doc)
-            
+            groups[self._group_id(doc)].append(doc)
+
         # Round Robin
         reranked = []
         keys = list(groups.keys())
-        random.shuffle(keys) # Randomize starting group
-        
+        # Randomize starting group; per-query RNG so the order doesn't depend on
+        # which queries ran before (or concurrently, with --workers)
+        random.Random(f"{self.seed}:{query}").shuffle(keys)
+
         while len(reranked) < self.top_k and any(groups.values()):
             for k in keys:
                 if groups[k]:
                     reranked.append(groups[k].pop(0))
                 if len(reranked) >= self.top_k:
                     break
-                    
+
         return reranked
 
+    def _mmr_rerank(self, query: str, docs: List[Dict]) -> List[Dict]:
+        """
+        Exposure-constrained MMR over the candidate similarity matrix.
+        At each step picks argmax(lambda * rel - (1 - lambda) * max_sim_to_selected)
+        among documents whose source group has not reached its exposure cap.
+        """
+        if len(docs) <= 1:
+            return docs[:self.top_k]
+
+        # Single batched embedding call: query first, then all candidates
+        texts = [query] + [f"{doc.get('title', '')} {doc.get('content', '')}" for doc in docs]
+        emb = np.asarray(self.embedder.encode(texts), dtype=np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+        relevance = emb[1:] @ emb[0]
+        sim = emb[1:] @ emb[1:].T
+
+        group_ids = [self._group_id(doc) for doc in docs]
+        unique_groups = sorted(set(group_ids))
+        group_idx = np.array([unique_groups.index(g) for g in group_ids])
+        cap = self.max_per_group or math.ceil(self.top_k / len(unique_groups))
+        group_counts = np.zeros(len(unique_groups), dtype=np.int64)
+
+        k = min(self.top_k, len(docs))
+        max_sim = np.zeros(len(docs), dtype=np.float32)
+        available = np.ones(len(docs), dtype=bool)
+        selected = []
+        for _ in range(k):
+            eligible = available & (group_counts[group_idx] < cap)
+            if not eligible.any():
+                # Every group hit its cap; relax it rather than return fewer docs
+                eligible = available
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_sim
+            j = int(np.argmax(np.where(eligible, scores, -np.inf)))
+            selected.append(j)
+            available[j] = False
+            group_counts[group_idx[j]] += 1
+            np.maximum(max_sim, sim[:, j], out=max_sim)
+
+        return [docs[j] for j in selected]
+
     def run(self, query: str) -> Dict:
         # 1. Retrieve MORE than needed (e.g. 2x)
         raw_context = self.base.retrieve(query, top_k=self.top_k * 3)
-        
+
         # 2. Fair Rerank
-        fair_context = self._fair_rerank(raw_context)
-        
+        if self.mode == "mmr":
+            fair_context = self._mmr_rerank(query, raw_context)
+        else:
+            fair_context = self._fair_rerank(query, raw_context)
+
         # 3. Generate
         response = self.base.generate(query, fair_context)
-        
+
         return {"response": response, "context": fair_context}
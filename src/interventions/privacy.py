@@ -1,10 +1,4 @@
 from typing import List, Dict
-try:
-    from presidio_analyzer import AnalyzerEngine
-    from presidio_anonymizer import AnonymizerEngine
-except ImportError:
-    AnalyzerEngine = None
-    AnonymizerEngine = None
 
 class PrivacyRAG:
     """
@@ -13,6 +7,14 @@ class PrivacyRAG:
     """
     def __init__(self, base_pipeline):
         self.base = base_pipeline
+        # Presidio (and the spaCy model behind it) is imported only when this
+        # variant is actually instantiated.
+        try:
+            from presidio_analyzer import AnalyzerEngine
+            from presidio_anonymizer import AnonymizerEngine
+        except ImportError:
+            AnalyzerEngine = None
+            AnonymizerEngine = None
         if AnalyzerEngine:
             self.analyzer = AnalyzerEngine()
             self.anonymizer = AnonymizerEngine()
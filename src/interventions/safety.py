@@ -5,15 +5,27 @@ class SafetyRAG:
     Wraps a RAG pipeline with Input/Output Guardrails.
     Uses a Classifier (e.g., Llama Guard) to check content.
     """
-    def __init__(self, base_pipeline, safety_classifier):
+    def __init__(self, base_pipeline, safety_classifier, prefilter=None):
         self.base = base_pipeline
         self.classifier = safety_classifier # Function or Model
-        
+        # Optional cheap first stage (e.g. src.lexicon.LexiconMatcher): texts with
+        # no lexicon hit are treated as safe without invoking the classifier.
+        self.prefilter = prefilter
+        self.classifier_calls = 0
+        self.prefiltered = 0
+
     def _check_safety(self, text: str, role: str) -> bool:
         """
         Returns False if content is unsafe.
         Role: 'User' (Prompt Injection) or 'Agent' (Toxic Output)
         """
+        if self.prefilter is not None and not self.prefilter.contains(text):
+            self.prefiltered += 1
+            return True
+        if self.classifier is None:
+            # Prefilter-only mode: any lexicon hit is unsafe
+            return False
+
         # Template for Llama Guard
         prompt = f"""
         [INST] Task: Check if there is unsafe content in '{role}' messages in the following conversation according to our safety policy with the below categories.
@@ -39,6 +51,7 @@ class SafetyRAG:
         
         # In real impl, we call self.classifier(prompt)
         # Mocking logic for the benchmark structure:
+        self.classifier_calls += 1
         is_safe = "unsafe" not in self.classifier.predict(prompt)
         return is_safe
 
@@ -0,0 +1,130 @@
+from collections import deque
+from typing import List, Dict, Iterable, Optional
+
+class LexiconMatcher:
+    """
+    Multi-pattern matcher (Aho-Corasick automaton) for policy lexicons.
+
+    The automaton is compiled once from all terms; each text is then scanned in
+    a single linear pass regardless of lexicon size, instead of one substring
+    test per term. Matching can fold case and/or require word boundaries.
+    """
+    def __init__(self, terms: Iterable, case_insensitive: bool = True, word_boundary: bool = True,
+                 match_prefixes: bool = False):
+        """
+        terms: strings, or (term, category) pairs. A trailing "*" marks a prefix
+        term: with word_boundary, only the boundary before it is required, so
+        "bomb*" also matches "bombs" and "bombing".
+        match_prefixes: treat every term as a prefix term.
+        """
+        self.case_insensitive = case_insensitive
+        self.word_boundary = word_boundary
+        self.match_prefixes = match_prefixes
+        self.terms = []       # term id -> normalized term
+        self.categories = []  # term id -> category (or None)
+        self.prefix = []      # term id -> matches as a word prefix
+
+        self._goto = [{}]    # state -> {char: next state}
+        self._fail = [0]
+        self._out = [[]]     # state -> term ids ending here (incl. via fail links)
+
+        for entry in terms:
+            term, category = (entry, None) if isinstance(entry, str) else entry
+            term = term.strip()
+            prefix = term.endswith("*")
+            term = self._normalize(term.rstrip("*"))
+            if term:
+                self._add(term, category, prefix)
+        self._build_fail_links()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "LexiconMatcher":
+        """
+        One term per line, optionally followed by a tab and a category.
+        Blank lines and lines starting with '#' are ignored.
+        """
+        terms = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                term, _, category = line.partition("\t")
+                terms.append((term, category.strip() or None))
+        return cls(terms, **kwargs)
+
+    def _normalize(self, text: str) -> str:
+        return text.casefold() if self.case_insensitive else text
+
+    def _add(self, term: str, category: Optional[str], prefix: bool = False):
+        state = 0
+        for ch in term:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(len(self.terms))
+        self.terms.append(term)
+        self.categories.append(category)
+        self.prefix.append(prefix)
+
+    def _build_fail_links(self):
+        # BFS over the trie; a state's fail link is the longest proper suffix that is also a trie path
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state == 0:
+                    self._fail[nxt] = 0
+                else:
+                    fail = self._fail[state]
+                    while fail and ch not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    @staticmethod
+    def _is_word_char(ch: str) -> bool:
+        return ch.isalnum() or ch == "_"
+
+    def find(self, text: str) -> List[Dict]:
+        """
+        All matches in text as {"term", "category", "start", "end"} (offsets into
+        the case-folded text when case_insensitive).
+        """
+        text = self._normalize(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for term_id in out[state]:
+                term = self.terms[term_id]
+                start, end = i - len(term) + 1, i + 1
+                if self.word_boundary and (
+                    (start > 0 and self._is_word_char(text[start - 1]) and self._is_word_char(term[0])) or
+                    (not (self.match_prefixes or self.prefix[term_id]) and end < len(text) and
+                     self._is_word_char(text[end]) and self._is_word_char(term[-1]))
+                ):
+                    continue
+                matches.append({"term": term, "category": self.categories[term_id], "start": start, "end": end})
+        return matches
+
+    def contains(self, text: str) -> bool:
+        return bool(self.find(text))
+
+    def find_batch(self, texts: List[str]) -> List[List[Dict]]:
+        return [self.find(text) for text in texts]
+
+    def contains_batch(self, texts: List[str]) -> List[bool]:
+        return [self.contains(text) for text in texts]
+
+    def __len__(self) -> int:
+        return len(self.terms)
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+
+PROMPT_TEMPLATE = """Use the following context to answer the question.
+
+Context:
+{context}
+
+Question: {query}
+
+Answer:"""
+
+def format_doc(doc: Dict) -> str:
+    return f"[{doc['title']}] {doc['content']}"
+
+def build_prompt(query: str, context: List[Dict]) -> str:
+    """Standard RAG prompt shared by StandardRAG and interventions that bypass it."""
+    context_str = "\n".join([format_doc(doc) for doc in context])
+    return PROMPT_TEMPLATE.format(context=context_str, query=query)
+
+class ContextPacker:
+    """
+    Fits retrieved documents into a fixed token budget before prompting.
+    Documents are taken in relevance (retrieval) order; a document that does not
+    fit is truncated if enough budget is left, otherwise dropped. This bounds
+    prefill cost per sample regardless of how many documents the retriever (or
+    FairnessRAG's over-retrieval) returns.
+
+    Tokens are counted with the backbone tokenizer when available, falling back
+    to whitespace words (e.g. for MockLLM).
+    """
+    def __init__(self, tokenizer=None, max_context_tokens: int = 2048,
+                 min_truncated_tokens: int = 32, cache_size: int = 4096):
+        self.tokenizer = tokenizer
+        self.max_context_tokens = max_context_tokens
+        self.min_truncated_tokens = min_truncated_tokens # Don't keep stubs shorter than this
+        self.cache_size = cache_size
+        self._cache = OrderedDict() # text -> token ids (LRU)
+        self._lock = threading.Lock()
+
+    def _tokenize(self, text: str) -> Tuple:
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+        if self.tokenizer is not None:
+            tokens = tuple(self.tokenizer.encode(text, add_special_tokens=False))
+        else:
+            tokens = tuple(text.split())
+        with self._lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._tokenize(text))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self._tokenize(text)[:max_tokens]
+        if self.tokenizer is not None:
+            return self.tokenizer.decode(list(tokens), skip_special_tokens=True)
+        return " ".join(tokens)
+
+    def pack(self, context: List[Dict]) -> Tuple[List[Dict], Dict[str, Any]]:
+        """
+        Returns (packed_context, report). The report records the budget used
+        and every document that was truncated or dropped.
+        """
+        packed = []
+        cuts = []
+        used = 0
+        # Each document is joined with a newline; count it with the document
+        newline_tokens = self.count_tokens("\n") if self.tokenizer is not None else 0
+
+        for i, doc in enumerate(context):
+            doc_tokens = self.count_tokens(format_doc(doc)) + (newline_tokens if packed else 0)
+            remaining = self.max_context_tokens - used
+
+            if doc_tokens <= remaining:
+                packed.append(doc)
+                used += doc_tokens
+                continue
+
+            cut = {
+                "index": i,
+                "title": doc.get("title", ""),
+                "source": doc.get("source", ""),
+                "original_tokens": doc_tokens,
+                "kept_tokens": 0,
+                "action": "dropped",
+            }
+            header_tokens = doc_tokens - self.count_tokens(doc.get("content", ""))
+            content_budget = remaining - header_tokens
+            truncated = None
+            while content_budget >= self.min_truncated_tokens:
+                truncated = dict(doc)
+                truncated["content"] = self._truncate(doc.get("content", ""), content_budget)
+                kept = self.count_tokens(format_doc(truncated)) + (newline_tokens if packed else 0)
+                if kept <= remaining:
+                    break
+                # Decoded text can re-tokenize longer (BPE merges at the cut); shrink by the overrun
+                content_budget -= kept - remaining
+                truncated = None
+            if truncated is not None:
+                packed.append(truncated)
+                used += kept
+                cut["kept_tokens"] = kept
+                cut["action"] = "truncated"
+            cuts.append(cut)
+
+        report = {
+            "budget": self.max_context_tokens,
+            "used_tokens": used,
+            "input_docs": len(context),
+            "kept_docs": len(packed),
+            "cuts": cuts,
+        }
+        return packed, report
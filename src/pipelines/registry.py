@@ -0,0 +1,77 @@
+import importlib
+from typing import Any, Callable, Dict, List, Optional
+
+# Variant name -> (module path relative to this package, class name, default kwargs).
+# Modules are only imported when a variant is built, so selecting a subset of
+# variants never pulls in the dependencies of the others.
+VARIANTS = {
+    "Naive-RAG": None,  # The base pipeline itself
+    "Safety-RAG": ("..interventions.safety", "SafetyRAG", {}),
+    "Privacy-RAG": ("..interventions.privacy", "PrivacyRAG", {}),
+    "Fairness-RAG": ("..interventions.fairness", "FairnessRAG", {}),
+    "Accountability-RAG": ("..interventions.accountability", "AccountabilityRAG", {}),
+    "Reliability-RAG": ("..interventions.reliability", "ReliabilityRAG", {"num_samples": 3}), # 3 samples for speed
+    "Robustness-RAG": ("..interventions.robustness", "RobustnessRAG", {}),
+}
+
+class PipelineRegistry:
+    """
+    Lazily builds benchmark pipeline variants on top of a shared base pipeline.
+    Neither the base (model load) nor any intervention is created until first requested.
+    """
+    def __init__(self, base_factory: Callable[[], Any], variant_kwargs: Optional[Dict[str, Dict]] = None):
+        self.base_factory = base_factory
+        self.variant_kwargs = variant_kwargs or {}
+        self._base = None
+        self._instances = {}
+
+    @staticmethod
+    def available() -> List[str]:
+        return list(VARIANTS.keys())
+
+    @staticmethod
+    def select(spec: str) -> List[str]:
+        """
+        Resolve a comma-separated --variants spec ("all", "Safety-RAG,naive")
+        into registry names. Matching is case-insensitive and the "-RAG"
+        suffix is optional.
+        """
+        if not spec or spec.strip().lower() == "all":
+            return list(VARIANTS.keys())
+
+        lookup = {}
+        for name in VARIANTS:
+            lookup[name.lower()] = name
+            lookup[name.lower().replace("-rag", "")] = name
+
+        selected = []
+        for item in spec.split(","):
+            key = item.strip().lower()
+            if not key:
+                continue
+            if key not in lookup:
+                raise ValueError(f"Unknown variant '{item.strip()}'. Available: {', '.join(VARIANTS)}")
+            if lookup[key] not in selected:
+                selected.append(lookup[key])
+        return selected
+
+    @property
+    def base(self):
+        if self._base is None:
+            self._base = self.base_factory()
+        return self._base
+
+    def get(self, name: str):
+        if name not in VARIANTS:
+            raise KeyError(f"Unknown variant '{name}'. Available: {', '.join(VARIANTS)}")
+        if name not in self._instances:
+            spec = VARIANTS[name]
+            if spec is None:
+                self._instances[name] = self.base
+            else:
+                module_name, class_name, defaults = spec
+                module = importlib.import_module(module_name, __package__)
+                kwargs = dict(defaults)
+                kwargs.update(self.variant_kwargs.get(name, {}))
+                self._instances[name] = getattr(module, class_name)(self.base, **kwargs)
+        return self._instances[name]
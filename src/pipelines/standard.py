@@ -1,29 +1,71 @@
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional
 from .base import RAGPipeline
-from ..models import HuggingFaceLLM
-from ..retrieval import WebRetriever
+from ..models import LLM, HuggingFaceLLM
+from ..retrieval import Retriever, WebRetriever
+from .context import ContextPacker, build_prompt
 
 class StandardRAG(RAGPipeline):
-    def __init__(self, model_name: str = "meta-llama/Meta-Llama-3-8B-Instruct"):
-        self.llm = HuggingFaceLLM(model_name)
-        self.retriever = WebRetriever()
-        
+    def __init__(self, model_name: str = "meta-llama/Meta-Llama-3-8B-Instruct",
+                 llm: Optional[LLM] = None, retriever: Optional[Retriever] = None,
+                 max_context_tokens: int = 2048, deduplicator=None):
+        # Backends can be injected (e.g. MockLLM/MockRetriever for --mock runs)
+        self.llm = llm if llm is not None else HuggingFaceLLM(model_name)
+        self.retriever = retriever if retriever is not None else WebRetriever()
+        # Token budget for retrieved context (counted with the backbone tokenizer)
+        self.packer = ContextPacker(getattr(self.llm, "tokenizer", None), max_context_tokens)
+        # Optional retrieval post-processing (e.g. src.dedup.NearDuplicateFilter)
+        self.deduplicator = deduplicator
+        # Per-thread reports, so concurrent runs (--workers) don't see each other's
+        self._local = threading.local()
+
+    @property
+    def last_packing(self) -> Optional[Dict]:
+        return getattr(self._local, "packing", None)
+
+    @property
+    def last_dedup(self) -> Optional[Dict]:
+        return getattr(self._local, "dedup", None)
+
+    @property
+    def last_packed_context(self) -> Optional[List[Dict]]:
+        """The context as it was actually sent to the model (after packing)."""
+        return getattr(self._local, "packed", None)
+
+    def clear_reports(self):
+        """Forget this thread's reports, e.g. before running the next sample."""
+        self._local.__dict__.clear()
+
     def retrieve(self, query: str, top_k: int = 5) -> List[Dict]:
-        return self.retriever.retrieve(query, top_k)
+        docs = self.retriever.retrieve(query, top_k)
+        if self.deduplicator is not None:
+            docs, self._local.dedup = self.deduplicator.dedup(docs)
+        return docs
 
-    def generate(self, query: str, context: List[Dict]) -> str:
-        context_str = "\n".join([f"[{doc['title']}] {doc['content']}" for doc in context])
-        prompt = f"""Use the following context to answer the question.
-        
-Context:
-{context_str}
+    def retrieve_batch(self, queries: List[str], top_k: int = 5, across_queries: bool = False) -> List[List[Dict]]:
+        """
+        Retrieve for several queries and deduplicate them in one signature pass.
+        With across_queries, a document already kept for an earlier query is
+        dropped too, for callers that consume the contexts together. The
+        per-query reports are kept in self.last_dedup (a list).
+        """
+        contexts = [self.retriever.retrieve(query, top_k) for query in queries]
+        if self.deduplicator is not None:
+            contexts, self._local.dedup = self.deduplicator.dedup_batch(contexts, across_queries=across_queries)
+        return contexts
 
-Question: {query}
+    def pack_context(self, context: List[Dict]) -> List[Dict]:
+        """Fit context into the token budget; what was cut is kept in self.last_packing."""
+        packed, self._local.packing = self.packer.pack(context)
+        self._local.packed = packed
+        return packed
 
-Answer:"""
+    def generate(self, query: str, context: List[Dict]) -> str:
+        prompt = build_prompt(query, self.pack_context(context))
         return self.llm.generate(prompt)
         
     def run(self, query: str) -> Dict[str, Any]:
         context = self.retrieve(query)
         response = self.generate(query, context)
-        return {"response": response, "context": context}
+        return {"response": response, "context": context, "context_packing": self.last_packing,
+                "dedup": self.last_dedup}
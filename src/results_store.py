@@ -0,0 +1,117 @@
+import json
+import hashlib
+import argparse
+from typing import Any, Dict
+
+FORMAT = "rag-trust-results/v2"
+
+def content_hash(obj: Any) -> str:
+    canonical = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+class ResultsStore:
+    """
+    Benchmark results with retrieved documents and dataset samples stored once.
+
+    Responses keep `context_refs` / `ground_truth_ref` (content hashes) instead of
+    full copies; the documents and samples live in side tables shared by every
+    variant and dimension. `rehydrate` / `export_legacy` rebuild the original
+    per-response schema ({"response", "context": [...], "ground_truth": {...}}).
+    """
+    def __init__(self):
+        self.documents = {}
+        self.samples = {}
+        self.results = {}
+
+    def _intern(self, table: Dict[str, Any], obj: Any) -> str:
+        key = content_hash(obj)
+        if key not in table:
+            table[key] = obj
+        return key
+
+    def compact(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the context documents and ground truth of a response by references."""
+        compact = {k: v for k, v in response.items() if k not in ("context", "ground_truth")}
+        if "context" in response:
+            compact["context_refs"] = [self._intern(self.documents, doc) for doc in response["context"]]
+        if "ground_truth" in response:
+            compact["ground_truth_ref"] = self._intern(self.samples, response["ground_truth"])
+        return compact
+
+    def add(self, variant: str, dimension: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a response; returns its compact form (with ground_truth_ref)."""
+        compact = self.compact(response)
+        self.results.setdefault(variant, {}).setdefault(dimension, []).append(compact)
+        return compact
+
+    def set_scores(self, variant: str, scores: Dict[str, float]):
+        self.results.setdefault(variant, {})["scores"] = scores
+
+    def rehydrate(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Inverse of compact(): the response with full context and ground truth."""
+        full = {k: v for k, v in response.items() if k not in ("context_refs", "ground_truth_ref")}
+        if "context_refs" in response:
+            full["context"] = [self.documents[key] for key in response["context_refs"]]
+        if "ground_truth_ref" in response:
+            full["ground_truth"] = self.samples[response["ground_truth_ref"]]
+        return full
+
+    def iter_responses(self, variant: str, dimension: str, rehydrate: bool = False):
+        for response in self.results.get(variant, {}).get(dimension, []):
+            yield self.rehydrate(response) if rehydrate else response
+
+    def to_legacy(self) -> Dict[str, Any]:
+        """Results in the original benchmark_data.json schema (one copy per response)."""
+        legacy = {}
+        for variant, dims in self.results.items():
+            legacy[variant] = {}
+            for dim, value in dims.items():
+                if dim == "scores":
+                    legacy[variant][dim] = value
+                else:
+                    legacy[variant][dim] = [self.rehydrate(r) for r in value]
+        return legacy
+
+    def save(self, path: str):
+        data = {
+            "format": FORMAT,
+            "documents": self.documents,
+            "samples": self.samples,
+            "results": self.results,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "ResultsStore":
+        """Load a results file; legacy (per-response copy) files are compacted on load."""
+        with open(path, "r") as f:
+            data = json.load(f)
+        store = cls()
+        if data.get("format") == FORMAT:
+            store.documents = data["documents"]
+            store.samples = data["samples"]
+            store.results = data["results"]
+            return store
+        for variant, dims in data.items():
+            for dim, value in dims.items():
+                if dim == "scores":
+                    store.set_scores(variant, value)
+                else:
+                    for response in value:
+                        store.add(variant, dim, response)
+        return store
+
+    def export_legacy(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_legacy(), f, indent=4)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export deduplicated results to the per-response JSON schema")
+    parser.add_argument("--results_file", type=str, required=True)
+    parser.add_argument("--output", type=str, required=True)
+    args = parser.parse_args()
+
+    store = ResultsStore.load(args.results_file)
+    store.export_legacy(args.output)
+    print(f"Exported {args.results_file} -> {args.output}")
@@ -5,6 +5,18 @@ class Retriever:
     def retrieve(self, query: str, top_k: int = 5) -> List[Dict]:
         raise NotImplementedError
 
+def _simulated_docs(query: str, top_k: int) -> List[Dict]:
+    return [{
+        "content": f"Simulated retrieval result {i} for query: {query}. This is a placeholder context containing relevant facts.",
+        "title": f"Document {i}",
+        "source": "simulated_kb"
+    } for i in range(top_k)]
+
+class MockRetriever(Retriever):
+    """Offline retriever returning simulated documents (no network, no imports)."""
+    def retrieve(self, query: str, top_k: int = 5) -> List[Dict]:
+        return _simulated_docs(query, top_k)
+
 class WebRetriever(Retriever):
     def __init__(self, max_retries=3):
         try:
@@ -36,8 +48,4 @@ class WebRetriever(Retriever):
 
     def _mock_retrieve(self, query: str, top_k: int) -> List[Dict]:
         # Fallback for when internet is down or lib missing
-        return [{
-            "content": f"Simulated retrieval result {i} for query: {query}. This is a placeholder context containing relevant facts.",
-            "title": f"Document {i}",
-            "source": "simulated_kb"
-        } for i in range(top_k)]
+        return _simulated_docs(query, top_k)
@@ -0,0 +1,128 @@
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import List, Dict, Optional, Any
+
+from .models import LLM
+
+class _Request:
+    __slots__ = ("prompt", "max_new_tokens", "seed", "future")
+
+    def __init__(self, prompt: str, max_new_tokens: int, seed: Optional[int]):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.seed = seed
+        self.future = Future()
+
+class BatchingLLM(LLM):
+    """
+    In-process micro-batching scheduler in front of a shared LLM.
+
+    Any number of threads (or coroutines, via `agenerate`) submit prompts; a
+    single worker thread collects them into batches of up to `max_batch_size`,
+    waiting at most `max_wait_ms` after the first request, and runs each batch
+    through the backend's `generate_batch`. `generate` keeps the plain LLM
+    signature, so existing pipelines get batching just by being called
+    concurrently.
+
+    Requests in a batch must share max_new_tokens; mixed requests are split
+    into one sub-batch per value. Other attributes are delegated to the backend.
+    """
+    def __init__(self, llm: LLM, max_batch_size: int = 8, max_wait_ms: float = 10.0):
+        self.llm = llm
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self.batches = 0
+        self.requests = 0
+        self._worker = threading.Thread(target=self._loop, name="llm-batcher", daemon=True)
+        self._worker.start()
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def decoding_params(self) -> Dict[str, Any]:
+        return self.llm.decoding_params()
+
+    def submit(self, prompt: str, max_new_tokens: int = 256, seed: Optional[int] = None) -> Future:
+        if self._closed:
+            raise RuntimeError("BatchingLLM is closed")
+        if seed is None:
+            # Derive the backend's per-call seed here, in the caller's occurrence
+            # scope, rather than on the worker thread
+            resolve_seed = getattr(self.llm, "resolve_seed", None)
+            if resolve_seed is not None:
+                seed = resolve_seed(prompt)
+        request = _Request(prompt, max_new_tokens, seed)
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt: str, max_new_tokens: int = 256, seed: Optional[int] = None) -> str:
+        return self.submit(prompt, max_new_tokens, seed).result()
+
+    async def agenerate(self, prompt: str, max_new_tokens: int = 256, seed: Optional[int] = None) -> str:
+        return await asyncio.wrap_future(self.submit(prompt, max_new_tokens, seed))
+
+    def _collect(self) -> List[_Request]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Shutdown: finish this batch, then let the loop exit
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.max_new_tokens, []).append(request)
+            for max_new_tokens, requests in groups.items():
+                self.batches += 1
+                self.requests += len(requests)
+                try:
+                    outputs = self.llm.generate_batch(
+                        [r.prompt for r in requests],
+                        max_new_tokens=max_new_tokens,
+                        seeds=[r.seed for r in requests],
+                    )
+                except Exception as e:
+                    for r in requests:
+                        r.future.set_exception(e)
+                    continue
+                for r, out in zip(requests, outputs):
+                    r.future.set_result(out)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    def close(self):
+        """Stop the worker after pending requests are served."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
@@ -1,44 +1,114 @@
+import os
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
-import json
 import argparse
+try:
+    from src.aggregate import ScoreAggregator, iter_score_batches, pivot
+except ImportError:
+    # Run as a script (python src/visualize.py)
+    from aggregate import ScoreAggregator, iter_score_batches, pivot
 
-def plot_tradeoff_heatmap(data: pd.DataFrame, output_file="trust_tradeoff_heatmap.png"):
+BASELINE = "Naive-RAG"
+
+def plot_radar(data: pd.DataFrame, ci_low: pd.DataFrame = None, ci_high: pd.DataFrame = None,
+               output_file="trust_radar.png"):
+    """
+    Radar chart of raw scores, one polygon per variant (rows) over the trust
+    dimensions (columns). If CI bounds are given, each polygon gets a shaded band.
+    """
+    dims = list(data.columns)
+    angles = np.linspace(0, 2 * np.pi, len(dims), endpoint=False).tolist()
+    angles += angles[:1]
+
+    fig, ax = plt.subplots(figsize=(8, 8), subplot_kw={"polar": True})
+    colors = sns.color_palette("tab10", len(data.index))
+    for color, variant in zip(colors, data.index):
+        values = data.loc[variant, dims].tolist()
+        ax.plot(angles, values + values[:1], color=color, linewidth=1.5, label=variant)
+        if ci_low is not None and ci_high is not None:
+            low = ci_low.loc[variant, dims].tolist()
+            high = ci_high.loc[variant, dims].tolist()
+            ax.fill_between(angles, low + low[:1], high + high[:1], color=color, alpha=0.15)
+
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(dims)
+    ax.set_ylim(0, 1)
+    ax.set_title("Trust Profile per Intervention")
+    ax.legend(loc="upper right", bbox_to_anchor=(1.3, 1.1), fontsize="small")
+    plt.tight_layout()
+    plt.savefig(output_file)
+    plt.close(fig)
+    print(f"Radar Chart saved to {output_file}")
+
+def plot_tradeoff_heatmap(data: pd.DataFrame, ci_low: pd.DataFrame = None, ci_high: pd.DataFrame = None,
+                          output_file="trust_tradeoff_heatmap.png"):
     """
     Generates a Heatmap of Impact Scores (Delta from Baseline).
+    If CI bounds are given, cells are annotated with the delta's bootstrap CI.
+    Skipped (returns False) unless the baseline and another variant were run.
     """
-    plt.figure(figsize=(10, 6))
-    
+    if BASELINE not in data.index or len(data.index) < 2:
+        print(f"Skipping trade-off heatmap: needs {BASELINE} and at least one other variant "
+              f"(got {', '.join(data.index) or 'none'})")
+        return False
+
     # Calculate Deltas: Row - BaselineRow
-    # Assuming 'Naive-RAG' is one of the rows
-    baseline = data.loc['Naive-RAG']
+    baseline = data.loc[BASELINE]
     deltas = data.sub(baseline, axis=1)
     
     # Drop the baseline row from visualization (it would be all zeros)
-    deltas = deltas.drop('Naive-RAG')
+    deltas = deltas.drop(BASELINE)
+
+    annot, fmt = True, ".2f"
+    if ci_low is not None and ci_high is not None:
+        # Shift each variant's CI by the baseline mean (baseline noise is not propagated)
+        low = ci_low.sub(baseline, axis=1).loc[deltas.index, deltas.columns]
+        high = ci_high.sub(baseline, axis=1).loc[deltas.index, deltas.columns]
+        annot = deltas.map(lambda v: f"{v:.2f}") + "\n[" + low.map(lambda v: f"{v:.2f}") + ", " + high.map(lambda v: f"{v:.2f}") + "]"
+        fmt = ""
 
-    sns.heatmap(deltas, annot=True, cmap="RdYlGn", center=0, fmt=".2f")
+    plt.figure(figsize=(10, 6))
+    sns.heatmap(deltas, annot=annot, cmap="RdYlGn", center=0, fmt=fmt)
     plt.title("Impact of Trust Interventions (Delta vs. Naive Baseline)")
     plt.ylabel("Intervention Strategy")
     plt.xlabel("Trust Dimensions")
     plt.tight_layout()
     plt.savefig(output_file)
+    plt.close()
     print(f"Trade-off Heatmap saved to {output_file}")
+    return True
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--results_file", type=str, required=True)
+    parser.add_argument("--results_file", type=str, nargs="+", required=True,
+                        help="viz_data.json and/or score record shards (*.jsonl files, globs or directories)")
+    parser.add_argument("--model", type=str, default=None, help="Only aggregate records for this backbone")
+    parser.add_argument("--config", type=str, default=None,
+                        help="Only aggregate records for this run configuration (hash printed by run_experiment.py)")
+    parser.add_argument("--include_mock", action="store_true", help="Also aggregate records from --mock runs")
+    parser.add_argument("--n_boot", type=int, default=1000, help="Bootstrap resamples for confidence intervals")
+    parser.add_argument("--ci", type=float, default=0.95, help="Confidence level")
+    parser.add_argument("--output_dir", type=str, default=".")
     args = parser.parse_args()
-    
-    with open(args.results_file, 'r') as f:
-        raw_data = json.load(f)
-    
-    df = pd.DataFrame(raw_data).T 
-    
+
+    # Stream records into per-variant, per-dimension score arrays
+    aggregator = ScoreAggregator().consume(iter_score_batches(args.results_file, model=args.model,
+                                                                config=args.config,
+                                                                include_mock=args.include_mock))
+    summary = aggregator.summary(n_boot=args.n_boot, ci=args.ci)
+    if summary.empty:
+        parser.error("No score records matched --model/--config (records from --mock runs need --include_mock)")
+    summary.to_csv(os.path.join(args.output_dir, "trust_scores_summary.csv"), index=False)
+
+    df = pivot(summary, "mean")
+    ci_low, ci_high = pivot(summary, "ci_low"), pivot(summary, "ci_high")
+
     # Plot the raw scores
-    plot_radar(df)
+    plot_radar(df, ci_low, ci_high, output_file=os.path.join(args.output_dir, "trust_radar.png"))
     
     # Plot the Trade-off Heatmap (New!)
-    plot_tradeoff_heatmap(df)
+    plot_tradeoff_heatmap(df, ci_low, ci_high, output_file=os.path.join(args.output_dir, "trust_tradeoff_heatmap.png"))
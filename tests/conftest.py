@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the benchmark modules the same way run_experiment.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHAT_TEMPLATE = ("{% for m in messages %}<s>{{ m['role'] }}: {{ m['content'] }}\n{% endfor %}"
+                 "{% if add_generation_prompt %}assistant:{% endif %}")
+
+CORPUS = [
+    "Use the following context to answer the question.",
+    "Context:",
+    "Question: what is the capital of France?",
+    "Answer:",
+    "Simulated retrieval result for query. This is a placeholder context containing relevant facts.",
+]
+
+def _save_tiny_llama(path, tokenizer, hidden_size, num_layers, seed):
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(vocab_size=len(tokenizer), hidden_size=hidden_size, intermediate_size=128,
+                         num_hidden_layers=num_layers, num_attention_heads=4, num_key_value_heads=4,
+                         max_position_embeddings=2048, bos_token_id=1, eos_token_id=2)
+    LlamaForCausalLM(config).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return str(path)
+
+@pytest.fixture(scope="session")
+def tiny_tokenizer():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    tokenizers = pytest.importorskip("tokenizers")
+    from transformers import PreTrainedTokenizerFast
+
+    tok = tokenizers.Tokenizer(tokenizers.models.BPE(unk_token="<unk>"))
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = tokenizers.decoders.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(vocab_size=512, special_tokens=["<unk>", "<s>", "</s>"],
+                                             initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet())
+    tok.train_from_iterator(CORPUS * 50, trainer)
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tok, bos_token="<s>", eos_token="</s>", unk_token="<unk>")
+    tokenizer.chat_template = CHAT_TEMPLATE
+    return tokenizer
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory, tiny_tokenizer):
+    """Path to a tiny randomly initialized Llama (CPU-sized, no download)."""
+    return _save_tiny_llama(tmp_path_factory.mktemp("tiny"), tiny_tokenizer, hidden_size=64, num_layers=2, seed=0)
+
+@pytest.fixture
+def prompts():
+    return [
+        f"Use the following context to answer the question.\n\nContext:\n"
+        f"[Document {i}] {'Simulated retrieval result with relevant facts. ' * (i + 1)}\n\n"
+        f"Question: what is item {i}?\n\nAnswer:"
+        for i in range(4)
+    ]
+
+@pytest.fixture(scope="session")
+def tiny_draft_model(tmp_path_factory, tiny_tokenizer):
+    """A second, smaller tiny Llama sharing the tokenizer (for assisted decoding)."""
+    return _save_tiny_llama(tmp_path_factory.mktemp("tiny_draft"), tiny_tokenizer, hidden_size=32, num_layers=1, seed=1)
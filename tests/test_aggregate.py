@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.aggregate import bootstrap_ci, iter_score_batches, upsert_records
+
+def record(sample, score, seed=0, config="a", variant="Naive-RAG"):
+    return {"model": "m", "seed": seed, "config": config, "mock": False, "variant": variant,
+            "dimension": "safety", "sample": sample, "score": score}
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_upsert_replaces_records_with_the_same_key(tmp_path):
+    path = str(tmp_path / "scores.jsonl")
+    assert upsert_records(path, [record(s, 0.0) for s in range(5)]) == 0
+    # Another seed and another config are kept alongside
+    upsert_records(path, [record(0, 0.5, seed=1), record(0, 0.5, config="b")])
+
+    assert upsert_records(path, [record(s, 1.0) for s in range(3)]) == 3
+    rows = read(path)
+    assert len(rows) == 7
+    scores = {(r["seed"], r["config"], r["sample"]): r["score"] for r in rows}
+    assert [scores[(0, "a", s)] for s in range(5)] == [1.0, 1.0, 1.0, 0.0, 0.0]
+    assert scores[(1, "a", 0)] == scores[(0, "b", 0)] == 0.5
+    assert not (tmp_path / "scores.jsonl.tmp").exists()
+
+def test_iter_score_batches_filters_on_config(tmp_path):
+    path = str(tmp_path / "scores.jsonl")
+    upsert_records(path, [record(s, 1.0, config="a") for s in range(4)] +
+                         [record(s, 0.0, config="b") for s in range(2)])
+
+    batches = list(iter_score_batches([path], config="b"))
+    assert [(v, d, list(s)) for v, d, s in batches] == [("Naive-RAG", "safety", [0.0, 0.0])]
+    assert sum(len(s) for _, _, s in iter_score_batches([path])) == 6
+
+def test_bootstrap_ci_width_on_large_binary_scores():
+    rng = np.random.default_rng(0)
+    scores = (rng.random(2_000_000) < 0.3).astype(np.float32)
+    low, high = bootstrap_ci(scores, n_boot=1000, rng=np.random.default_rng(1))
+
+    mean = scores.mean(dtype=np.float64)
+    # Normal approximation of the 95% interval of a proportion
+    expected = 2 * 1.96 * np.sqrt(mean * (1 - mean) / len(scores))
+    assert low < mean < high
+    assert abs((high - low) - expected) < 0.15 * expected
+
+def test_bootstrap_ci_count_resampling_matches_index_resampling():
+    rng = np.random.default_rng(0)
+    for scores in [(rng.random(4000) < 0.1).astype(np.float64), rng.random(4000)]:
+        by_index = bootstrap_ci(scores, n_boot=2000, rng=np.random.default_rng(1))
+        by_count = bootstrap_ci(scores, n_boot=2000, rng=np.random.default_rng(1), max_elements=0)
+        width = by_index[1] - by_index[0]
+        assert abs(by_count[0] - by_index[0]) < 0.15 * width
+        assert abs(by_count[1] - by_index[1]) < 0.15 * width
+
+def test_heatmap_is_skipped_without_baseline(tmp_path):
+    from src.visualize import plot_tradeoff_heatmap
+
+    data = pd.DataFrame({"safety": [0.5, 0.7]}, index=["Safety-RAG", "Fairness-RAG"])
+    output = tmp_path / "heatmap.png"
+    assert plot_tradeoff_heatmap(data, output_file=str(output)) is False
+    assert not output.exists()
+
+    data.loc["Naive-RAG"] = [0.4]
+    assert plot_tradeoff_heatmap(data, data - 0.1, data + 0.1, output_file=str(output)) is True
+    assert output.exists()
@@ -0,0 +1,35 @@
+import pytest
+
+from src.models import HuggingFaceLLM
+
+def _load(path, **kwargs):
+    return HuggingFaceLLM(path, device="cpu", cpu_dtype="float32", **kwargs)
+
+def _greedy(llm):
+    llm.generation_kwargs = {"do_sample": False}
+    return llm
+
+@pytest.mark.parametrize("draft", ["self", "smaller"])
+def test_assisted_greedy_matches_plain_decoding(tiny_model, tiny_draft_model, prompts, draft):
+    draft_path = tiny_model if draft == "self" else tiny_draft_model
+    plain = _greedy(_load(tiny_model, warmup=False))
+    assisted = _greedy(_load(tiny_model, warmup=False, draft_model_name=draft_path, num_assistant_tokens=4))
+    assert assisted.draft_model is not None
+
+    expected = [plain.generate(p, max_new_tokens=16) for p in prompts]
+    assert [assisted.generate(p, max_new_tokens=16) for p in prompts] == expected
+
+    stats = assisted.acceptance_stats()
+    assert stats["steps"] > 0
+    assert stats["proposed_tokens"] > 0
+    assert 0 <= stats["accepted_tokens"] <= stats["proposed_tokens"]
+    assert 0.0 <= stats["acceptance_rate"] <= 1.0
+    assert stats["tokens_per_step"] >= 1.0
+    if draft == "self":
+        # Identical weights: the backbone agrees with (nearly) every proposal
+        assert stats["acceptance_rate"] > 0.9
+
+def test_acceptance_stats_exclude_warmup(tiny_model):
+    llm = _load(tiny_model, warmup=True, draft_model_name=tiny_model)
+    assert llm.acceptance_stats()["steps"] == 0
+    assert llm.perf_stats()["assisted"]["proposed_tokens"] == 0
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from src.cache import ResponseCache
+from src.models import LLM, CachedLLM, HuggingFaceLLM, occurrence_scope
+from src.scheduler import BatchingLLM
+
+class EchoSeedLLM(LLM):
+    """Returns the seed it was called with, so cache replays are visible."""
+    def __init__(self, **params):
+        self.model_name = "echo"
+        self.params = dict({"do_sample": True, "seed": 0}, **params)
+        self.calls = 0
+
+    def decoding_params(self):
+        return dict(self.params)
+
+    def generate(self, prompt, max_new_tokens=256, seed=None):
+        self.calls += 1
+        return f"{prompt}|{seed}"
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+def _run(llm, prompts):
+    outputs = []
+    for prompt in prompts:
+        with occurrence_scope():
+            outputs.append(llm.generate(prompt))
+    return outputs
+
+def test_batched_and_unbatched_runs_share_entries(cache):
+    prompts = ["a", "b", "a"]
+    expected = _run(CachedLLM(EchoSeedLLM(), cache), prompts)
+
+    backend = EchoSeedLLM()
+    batching = BatchingLLM(backend)
+    try:
+        assert _run(CachedLLM(batching, cache), prompts) == expected
+    finally:
+        batching.close()
+    assert backend.calls == 0
+
+@pytest.mark.parametrize("load_config", [{"device": "cpu", "int8": True}, {"dtype": "bfloat16"},
+                                         {"draft_model": "tiny-draft"}])
+def test_load_config_is_part_of_the_key(cache, load_config):
+    _run(CachedLLM(EchoSeedLLM(device="auto", dtype="float16", int8=False, draft_model=None), cache), ["a", "b"])
+
+    backend = EchoSeedLLM(**dict({"device": "auto", "dtype": "float16", "int8": False, "draft_model": None},
+                                 **load_config))
+    _run(CachedLLM(backend, cache), ["a", "b"])
+    assert backend.calls == 2
+
+def test_occurrences_are_counted_per_scope(cache):
+    llm = CachedLLM(EchoSeedLLM(), cache)
+    with occurrence_scope():
+        first = [llm.generate("a"), llm.generate("a")]
+    assert first[0] != first[1]  # Repeats within a run get their own seeds
+    # Another run (e.g. a different variant) starts counting from zero again
+    with occurrence_scope():
+        assert llm.generate("a") == first[0]
+
+def test_watermarked_generation_is_thread_independent(tiny_model, prompts):
+    from src.interventions.accountability import AccountabilityRAG
+    from src.pipelines.standard import StandardRAG
+    from src.retrieval import MockRetriever
+
+    llm = HuggingFaceLLM(tiny_model, seed=0, device="cpu", cpu_dtype="float32", warmup=False)
+    pipeline = AccountabilityRAG(StandardRAG("tiny", llm=llm, retriever=MockRetriever()), max_new_tokens=12)
+
+    def generate(query, out, i):
+        with occurrence_scope():
+            out[i] = pipeline.generate(query, [])
+
+    sequential = [None] * len(prompts)
+    for i, query in enumerate(prompts):
+        generate(query, sequential, i)
+    concurrent = [None] * len(prompts)
+    threads = [threading.Thread(target=generate, args=(q, concurrent, i)) for i, q in enumerate(prompts)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert concurrent == sequential
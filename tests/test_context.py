@@ -0,0 +1,21 @@
+import random
+
+import pytest
+
+from src.pipelines.context import ContextPacker, format_doc
+
+WORDS = ("the capital of France is Paris, café naïve résumé 東京 data-driven e-mail x86_64 !!! ... "
+         "placeholder relevant facts").split()
+
+@pytest.mark.parametrize("budget", range(40, 600, 7))
+def test_packed_context_never_exceeds_budget(tiny_tokenizer, budget):
+    rng = random.Random(budget)
+    docs = [{"title": f"D{i}", "source": "s",
+             "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120)))}
+            for i in range(8)]
+    packed, report = ContextPacker(tiny_tokenizer, budget, min_truncated_tokens=8).pack(docs)
+
+    assert report["used_tokens"] <= budget
+    # The joined context, re-tokenized as it appears in the prompt
+    context = "\n".join(format_doc(doc) for doc in packed)
+    assert len(tiny_tokenizer.encode(context, add_special_tokens=False)) <= budget
@@ -0,0 +1,67 @@
+import json
+import os
+import random
+
+import pytest
+
+from src.lexicon import LexiconMatcher
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+LEXICON = os.path.join(DATA, "safety_lexicon.txt")
+ALPHABET = "abhe ms_-."
+
+def brute_force(terms, text):
+    """Every (term, start, end) a whole-word / prefix scan finds, term by term."""
+    def word(ch):
+        return ch.isalnum() or ch == "_"
+    found = []
+    for raw in terms:
+        prefix = raw.endswith("*")
+        term = raw.rstrip("*")
+        for start in range(len(text) - len(term) + 1):
+            end = start + len(term)
+            if text[start:end] != term:
+                continue
+            if start > 0 and word(text[start - 1]) and word(term[0]):
+                continue
+            if not prefix and end < len(text) and word(text[end]) and word(term[-1]):
+                continue
+            found.append((term, start, end))
+    return sorted(found)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_equal_brute_force_scan(seed):
+    rng = random.Random(seed)
+    # Short terms over a small alphabet, so they overlap and nest often
+    terms = {"".join(rng.choice(ALPHABET[:5]) for _ in range(rng.randint(1, 4))).strip()
+             for _ in range(rng.randint(1, 12))}
+    terms = [t + "*" if rng.random() < 0.3 else t for t in sorted(terms) if t]
+    text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 80)))
+
+    matches = LexiconMatcher(terms).find(text)
+    assert sorted((m["term"], m["start"], m["end"]) for m in matches) == brute_force(terms, text)
+
+def test_prefix_marker_applies_per_term():
+    matcher = LexiconMatcher(["bomb*", "meth"])
+    assert [m["term"] for m in matcher.find("pipe bombs and bombing")] == ["bomb", "bomb"]
+    assert matcher.contains("meth lab")
+    assert not matcher.contains("the method")
+    assert not matcher.contains("a carbomb")
+
+def test_shipped_lexicon_has_no_stem_false_positives():
+    matcher = LexiconMatcher.from_file(LEXICON)
+    for text in ["a new method", "methodology", "the gunner", "stealth mode", "a hackathon", "the heroine"]:
+        assert not matcher.contains(text), text
+    for text in ["pipe bombs", "a bombing", "he killed", "stolen goods", "hacked accounts", "suicidal thoughts"]:
+        assert matcher.contains(text), text
+
+def test_shipped_lexicon_keeps_mock_classifier_recall():
+    # Every text run_experiment.MockSafetyClassifier flags must reach it
+    matcher = LexiconMatcher.from_file(LEXICON)
+    with open(os.path.join(DATA, "composite_test_set.json")) as f:
+        dataset = json.load(f)
+    texts = [value for samples in dataset.values() for sample in samples
+             for value in sample.values() if isinstance(value, str)]
+    flagged = [t for t in texts if "bomb" in t.lower() or "suicide" in t.lower()]
+    assert flagged
+    assert [t for t in flagged if not matcher.contains(t)] == []
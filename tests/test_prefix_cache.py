@@ -0,0 +1,24 @@
+import pytest
+
+from src.models import HuggingFaceLLM
+
+def _load(path, **kwargs):
+    return HuggingFaceLLM(path, device="cpu", cpu_dtype="float32", warmup=False, **kwargs)
+
+@pytest.mark.parametrize("seed", [None, 0], ids=["greedy", "seeded-sampling"])
+def test_prefix_cache_matches_plain_decoding(tiny_model, prompts, seed):
+    plain = _load(tiny_model, seed=seed)
+    cached = _load(tiny_model, seed=seed, prefix_cache_size=4)
+    assert plain.available and cached.available
+    if seed is None:
+        plain.generation_kwargs = cached.generation_kwargs = {"do_sample": False}
+
+    # Every prompt shares the instruction prefix; the repeat reuses all but its last token
+    calls = prompts + prompts[:1]
+    expected = [plain.generate(p, max_new_tokens=12) for p in calls]
+    assert [cached.generate(p, max_new_tokens=12) for p in calls] == expected
+
+    stats = cached.prefix_cache.stats()
+    assert stats["hits"] == len(calls) - 1
+    assert stats["reused_tokens"] > 0
+    assert stats["entries"] == 4